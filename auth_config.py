@@ -0,0 +1,74 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+
+def etag_matches(if_none_match, etag):
+    """Return True if an If-None-Match header matches `etag`"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or etag in tags or f'W/{etag}' in tags
+
+
+class AuthConfigCache:
+    """In-memory copy of the public OAuth config from credentials.json.
+
+    The file is parsed once and re-read only when its modification time
+    changes; the mtime itself is checked at most every `check_interval`
+    seconds, so most requests do no disk I/O at all.
+    """
+
+    def __init__(self, path='credentials.json', check_interval=2.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = 0
+        self._entry = None
+
+    def _load(self):
+        with open(self.path, 'r') as f:
+            credentials = json.load(f)
+        body = json.dumps({'client_id': credentials['installed']['client_id']}).encode()
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        return body, etag
+
+    def get(self):
+        """Return (body, etag), reloading the file if it has changed.
+
+        Raises if the file has never been loaded successfully; after that a
+        broken update keeps serving the last good config.
+        """
+        now = time.monotonic()
+        entry = self._entry
+        if entry is not None and now - self._checked_at < self.check_interval:
+            return entry
+
+        with self._lock:
+            if self._entry is not None and now - self._checked_at < self.check_interval:
+                return self._entry
+            try:
+                mtime = os.path.getmtime(self.path)
+                if self._entry is None or mtime != self._mtime:
+                    self._entry = self._load()
+                    self._mtime = mtime
+                    logging.info(f"Loaded auth config from {self.path}")
+            except (OSError, ValueError, KeyError) as e:
+                if self._entry is None:
+                    raise
+                logging.error(f"Error reloading {self.path}, keeping cached config: {str(e)}")
+            self._checked_at = now
+            return self._entry
+
+    def headers(self, etag):
+        """Response headers for a cached auth config"""
+        return {
+            'Content-Type': 'application/json',
+            # Always revalidate, so a rotated client ID is picked up at once;
+            # an unchanged config costs only a 304 thanks to the ETag
+            'Cache-Control': 'no-cache',
+            'ETag': etag
+        }
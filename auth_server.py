@@ -1,38 +1,37 @@
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request, Response
 from flask_cors import CORS
-import json
 import os
 import logging
+from waitress import serve
+from log_config import setup_logging
+from auth_config import AuthConfigCache, etag_matches
 
 # Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('auth_server.log'),
-        logging.StreamHandler()
-    ]
-)
+setup_logging('auth_server.log')
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+# Parsed once and reloaded only when credentials.json changes
+auth_config = AuthConfigCache('credentials.json')
+
 @app.route('/auth-config')
 def get_auth_config():
     try:
-        # Read the client ID from credentials.json
-        with open('credentials.json', 'r') as f:
-            credentials = json.load(f)
-            client_id = credentials['installed']['client_id']
-        
-        logging.info("Successfully retrieved client ID")
-        return jsonify({
-            'client_id': client_id
-        })
+        body, etag = auth_config.get()
     except Exception as e:
         logging.error(f"Error reading credentials: {str(e)}")
         return jsonify({'error': 'Failed to read credentials'}), 500
+    
+    headers = auth_config.headers(etag)
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        return Response(status=304, headers=headers)
+    return Response(body, status=200, headers=headers)
 
 if __name__ == '__main__':
-    logging.info("Starting auth server on port 5001...")
-    app.run(host='0.0.0.0', port=5001) 
\ No newline at end of file
+    # The same route is also served by serve.py's threaded server
+    # Local-only by default; deployments opt in with AUTH_SERVER_HOST=0.0.0.0
+    host = os.getenv('AUTH_SERVER_HOST', '127.0.0.1')
+    port = int(os.getenv('AUTH_SERVER_PORT', 5001))
+    logging.info(f"Starting auth server on {host}:{port}...")
+    serve(app, host=host, port=port, threads=8)
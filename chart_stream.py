@@ -0,0 +1,105 @@
+import os
+import json
+import time
+import logging
+import threading
+
+
+def compute_delta(old_data, new_data):
+    """Return the months that changed between two chart data lists"""
+    old_by_month = {item['month']: item for item in old_data}
+    new_by_month = {item['month']: item for item in new_data}
+    return {
+        'upsert': [item for item in new_data if old_by_month.get(item['month']) != item],
+        'remove': [month for month in old_by_month if month not in new_by_month],
+        'order': [item['month'] for item in new_data]
+    }
+
+
+class ChartBroadcaster:
+    """Holds the latest chart aggregates and wakes up every waiting widget.
+
+    Aggregates are published once per report run; each connected client is
+    then sent either the small delta from the version it already has or, if
+    it is new or too far behind, a full snapshot.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._data = []
+        self._version = 0
+        self._last_delta = None
+
+    @property
+    def version(self):
+        with self._condition:
+            return self._version
+
+    def publish(self, chart_data):
+        """Publish new aggregates; returns False if nothing changed"""
+        with self._condition:
+            delta = compute_delta(self._data, chart_data)
+            if self._version and not delta['upsert'] and not delta['remove'] \
+                    and [item['month'] for item in self._data] == delta['order']:
+                return False
+            self._data = chart_data
+            self._version += 1
+            self._last_delta = delta
+            self._condition.notify_all()
+        logging.info(f"Published chart data version {self._version}")
+        return True
+
+    def _message(self, since):
+        """Build the update for a client that has version `since`"""
+        if since == self._version - 1 and self._last_delta is not None:
+            return dict(self._last_delta, type='delta', version=self._version)
+        return {'type': 'snapshot', 'version': self._version, 'data': self._data}
+
+    def wait_for_update(self, since=None, timeout=None):
+        """Block until there is a version newer than `since`.
+
+        Returns the message to send, or None if the timeout expired first.
+        """
+        with self._condition:
+            if since is not None and since > self._version:
+                # Client is from before a server restart
+                since = None
+            if since is None:
+                if self._version:
+                    return self._message(None)
+                since = 0
+            if not self._condition.wait_for(lambda: self._version > since, timeout):
+                return None
+            return self._message(since)
+
+
+def is_chart_data(data):
+    """Return True if data is a list of chart items with a month each"""
+    return isinstance(data, list) and all(
+        isinstance(item, dict) and 'month' in item for item in data
+    )
+
+
+def watch_chart_file(broadcaster, path='chart_data.json', interval=5.0, stop_event=None):
+    """Publish the contents of `path` whenever its modification time changes"""
+    last_mtime = None
+    while stop_event is None or not stop_event.is_set():
+        try:
+            mtime = os.path.getmtime(path)
+            if mtime != last_mtime:
+                with open(path, 'r') as f:
+                    data = json.load(f)
+                last_mtime = mtime
+                if is_chart_data(data):
+                    broadcaster.publish(data)
+                else:
+                    logging.warning(f"Ignoring {path}: expected a list of items with a 'month'")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            # This is the only watcher thread; keep it alive whatever happens
+            logging.warning(f"Error reading {path}: {str(e)}")
+        if stop_event is not None:
+            stop_event.wait(interval)
+        else:
+            time.sleep(interval)
@@ -0,0 +1,174 @@
+import os
+import json
+import heapq
+import logging
+from datetime import datetime
+
+SORT_FIELDS = ('tax', 'subtotal', 'total', 'count')
+
+
+def normalize_invoice(invoice):
+    """Flatten a HighLevel invoice into the fields used for reporting"""
+    # The API sends null for missing nested objects
+    contact = invoice.get('contactDetails') or {}
+    summary = invoice.get('totalSummary') or {}
+    return {
+        'id': invoice.get('_id') or invoice.get('invoiceNumber', 'N/A'),
+        'invoice_number': invoice.get('invoiceNumber', 'N/A'),
+        'date': datetime.strptime(invoice.get('issueDate', ''), '%Y-%m-%dT%H:%M:%S.%fZ').strftime('%Y-%m-%d'),
+        'customer_id': contact.get('id') or contact.get('name', 'N/A'),
+        'customer_name': contact.get('name', 'N/A'),
+        'subtotal': summary.get('subTotal', 0) or 0,
+        'tax': summary.get('tax', 0) or 0,
+        'total': invoice.get('total', 0) or 0,
+        'status': invoice.get('status', 'N/A')
+    }
+
+
+def normalize_invoices(invoices):
+    """Normalize raw invoices.
+
+    Returns (records, skipped), where skipped lists the invoice numbers
+    that could not be parsed.
+    """
+    records = []
+    skipped = []
+    for invoice in invoices:
+        try:
+            records.append(normalize_invoice(invoice))
+        except (ValueError, TypeError, AttributeError) as e:
+            skipped.append(invoice.get('invoiceNumber', 'N/A'))
+            logging.warning(f"Could not parse invoice {skipped[-1]}: {str(e)}")
+    return records, skipped
+
+
+class CustomerIndex:
+    """Per-customer index over normalized invoices.
+
+    Invoices are kept in an append-only list; each customer entry holds the
+    offsets of its invoices plus running subtotal, tax and total, so a
+    customer drill-down only touches that customer's invoices.
+    """
+
+    def __init__(self, path='customer_index.json'):
+        self.path = path
+        self.invoices = []
+        self.customers = {}
+        self._offsets = {}
+
+    @classmethod
+    def load(cls, path='customer_index.json'):
+        """Load an index from disk, or return an empty one"""
+        index = cls(path)
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    data = json.load(f)
+                index.invoices = data.get('invoices', [])
+                index.customers = data.get('customers', {})
+                index._offsets = {record['id']: i for i, record in enumerate(index.invoices)}
+            except (OSError, ValueError, KeyError) as e:
+                logging.error(f"Error loading customer index: {str(e)}")
+                return cls(path)
+        return index
+
+    def save(self):
+        """Write the index to disk"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'invoices': self.invoices, 'customers': self.customers}, f)
+        os.replace(tmp_path, self.path)
+
+    def _apply(self, customer_id, record, sign):
+        """Add (sign=1) or remove (sign=-1) a record from a customer's totals"""
+        entry = self.customers[customer_id]
+        entry['subtotal'] += sign * record['subtotal']
+        entry['tax'] += sign * record['tax']
+        entry['total'] += sign * record['total']
+        entry['count'] += sign
+
+    def add(self, record):
+        """Insert or replace a normalized invoice record"""
+        offset = self._offsets.get(record['id'])
+        if offset is not None:
+            old = self.invoices[offset]
+            self._apply(old['customer_id'], old, -1)
+            if old['customer_id'] != record['customer_id']:
+                self.customers[old['customer_id']]['offsets'].remove(offset)
+                if not self.customers[old['customer_id']]['offsets']:
+                    del self.customers[old['customer_id']]
+                offset_is_new = True
+            else:
+                offset_is_new = False
+            self.invoices[offset] = record
+        else:
+            offset = len(self.invoices)
+            self.invoices.append(record)
+            self._offsets[record['id']] = offset
+            offset_is_new = True
+
+        entry = self.customers.setdefault(record['customer_id'], {
+            'name': record['customer_name'],
+            'offsets': [],
+            'subtotal': 0,
+            'tax': 0,
+            'total': 0,
+            'count': 0
+        })
+        entry['name'] = record['customer_name']
+        if offset_is_new:
+            entry['offsets'].append(offset)
+        self._apply(record['customer_id'], record, 1)
+
+    def sync(self, records):
+        """Merge normalized invoice records into the index"""
+        for record in records:
+            self.add(record)
+        logging.info(f"Indexed {len(records)} invoices for {len(self.customers)} customers")
+        return len(records)
+
+    def _summary(self, customer_id, entry):
+        return {
+            'customer_id': customer_id,
+            'name': entry['name'],
+            'invoices': entry['count'],
+            'subtotal': round(entry['subtotal'], 2),
+            'tax': round(entry['tax'], 2),
+            'total': round(entry['total'], 2)
+        }
+
+    def top_customers(self, n=10, by='tax'):
+        """Return the n customers with the highest running `by` value"""
+        if by not in SORT_FIELDS:
+            raise ValueError(f"Cannot sort customers by {by!r}")
+        top = heapq.nlargest(n, self.customers.items(), key=lambda item: item[1][by])
+        return [self._summary(customer_id, entry) for customer_id, entry in top]
+
+    def customer_summary(self, customer_id):
+        """Return running totals for one customer, or None if unknown"""
+        entry = self.customers.get(customer_id)
+        if entry is None:
+            return None
+        return self._summary(customer_id, entry)
+
+    def customer_invoices(self, customer_id):
+        """Return the invoice records for one customer, oldest first"""
+        entry = self.customers.get(customer_id)
+        if entry is None:
+            return []
+        records = [self.invoices[offset] for offset in entry['offsets']]
+        return sorted(records, key=lambda record: record['date'])
+
+    def customer_time_series(self, customer_id):
+        """Return monthly subtotal, tax and total for one customer"""
+        monthly = {}
+        for record in self.customer_invoices(customer_id):
+            month = record['date'][:7]
+            bucket = monthly.setdefault(month, {'month': month, 'subtotal': 0, 'tax': 0, 'total': 0})
+            bucket['subtotal'] += record['subtotal']
+            bucket['tax'] += record['tax']
+            bucket['total'] += record['total']
+        return [
+            {key: round(value, 2) if key != 'month' else value for key, value in bucket.items()}
+            for bucket in monthly.values()
+        ]
@@ -0,0 +1,93 @@
+import os
+import gzip
+import queue
+import shutil
+import atexit
+import logging
+import logging.handlers
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+
+def _gzip_namer(name):
+    return f"{name}.gz"
+
+
+def _gzip_rotator(source, dest):
+    """Compress a rotated log file instead of keeping it as plain text"""
+    with open(source, 'rb') as f_in, gzip.open(dest, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def _rotating_handler(log_file, max_bytes, backup_count, when):
+    """Return a file handler that rotates by time if `when` is set, else by size"""
+    if when:
+        handler = logging.handlers.TimedRotatingFileHandler(
+            log_file, when=when, backupCount=backup_count)
+    else:
+        handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count)
+    handler.namer = _gzip_namer
+    handler.rotator = _gzip_rotator
+    return handler
+
+
+def _start_listener(logger, handlers):
+    """Route `logger` through a queue so callers never block on file I/O"""
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+def setup_logging(log_file, level=logging.INFO):
+    """Configure the root logger to write to a rotating, compressed log file.
+
+    Records are handed to a background thread through a queue, which writes
+    them to `log_file` and the console. Rotation is controlled by
+    LOG_MAX_BYTES (default 10 MB) or, if set, LOG_ROTATE_WHEN (e.g.
+    'midnight'); LOG_BACKUP_COUNT archives are kept.
+    """
+    max_bytes = int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024))
+    backup_count = int(os.getenv('LOG_BACKUP_COUNT', 5))
+    when = os.getenv('LOG_ROTATE_WHEN')
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    file_handler = _rotating_handler(log_file, max_bytes, backup_count, when)
+    stream_handler = logging.StreamHandler()
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    return _start_listener(root, [file_handler, stream_handler])
+
+
+def setup_audit_log(log_file=None):
+    """Return the logger for the per-invoice JSONL audit stream.
+
+    The stream is only written when `log_file` or AUDIT_LOG_FILE is set;
+    otherwise the logger is disabled and callers should check
+    ``audit.isEnabledFor(logging.INFO)`` before building records.
+    """
+    audit = logging.getLogger('sales_tax.audit')
+    audit.propagate = False
+    log_file = log_file or os.getenv('AUDIT_LOG_FILE')
+    if not log_file:
+        audit.setLevel(logging.CRITICAL + 1)
+        return audit
+    if audit.handlers:
+        return audit
+
+    max_bytes = int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024))
+    backup_count = int(os.getenv('LOG_BACKUP_COUNT', 5))
+    handler = _rotating_handler(log_file, max_bytes, backup_count, os.getenv('LOG_ROTATE_WHEN'))
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    audit.setLevel(logging.INFO)
+    _start_listener(audit, [handler])
+    return audit
@@ -0,0 +1,234 @@
+import os
+import sys
+import json
+import time
+import atexit
+import cProfile
+import pstats
+import logging
+import threading
+import tracemalloc
+from collections import Counter, defaultdict
+from datetime import datetime
+
+# Stacks sitting in these modules are counted as waiting on the network
+NETWORK_MODULES = {'socket.py', 'ssl.py', 'selectors.py'}
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+class Profiler:
+    """Profile a run of the report, reformat or serve paths.
+
+    Combines cProfile (function call counts, on every thread started while
+    profiling) and a wall-clock stack sampler (collapsed stacks for
+    flamegraphs, across all threads). Results are written to ``output_dir``
+    as ``<name>-<timestamp>.json``, ``.collapsed`` and ``.pstats``.
+
+    With ``trace_memory`` the run also records tracemalloc peak memory and
+    top allocation sites. tracemalloc slows allocation-heavy code by an
+    order of magnitude, so that run does not report the CPU / network-wait
+    split; use a separate run for timings. ``network_estimate`` should be
+    off for servers, whose main thread idles in ``select`` by design.
+    """
+
+    def __init__(self, name, output_dir='profiles', interval=0.005, top=30,
+                 trace_memory=False, network_estimate=True):
+        self.name = name
+        self.output_dir = output_dir
+        self.interval = interval
+        self.top = top
+        self.trace_memory = trace_memory
+        self.network_estimate = network_estimate
+        self._profile = cProfile.Profile()
+        self._thread_profiles = []
+        self._stacks = Counter()
+        self._thread_samples = defaultdict(lambda: {'samples': 0, 'network': 0})
+        self._ticks = 0
+        self._network_ticks = 0
+        self._stop_sampling = threading.Event()
+        self._sampler = None
+        self._running = False
+
+    def _profile_thread(self, frame, event, arg):
+        """threading.setprofile hook: give each new thread its own cProfile"""
+        profile = cProfile.Profile()
+        try:
+            # Replaces this hook for the rest of the thread's life
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ cProfile already covers every thread
+            sys.setprofile(None)
+            return
+        self._thread_profiles.append((threading.current_thread(), profile))
+
+    def _sample(self):
+        """Sampler thread body: record the current stack of every other thread"""
+        own_id = threading.get_ident()
+        while not self._stop_sampling.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            any_network = False
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                in_network = False
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    if os.path.basename(frame.f_code.co_filename) in NETWORK_MODULES:
+                        in_network = True
+                    frame = frame.f_back
+                thread_name = names.get(thread_id, str(thread_id))
+                stack.append(thread_name)
+                self._stacks[';'.join(reversed(stack))] += 1
+                counts = self._thread_samples[thread_name]
+                counts['samples'] += 1
+                if in_network:
+                    counts['network'] += 1
+                    any_network = True
+            self._ticks += 1
+            if any_network:
+                self._network_ticks += 1
+
+    def start(self):
+        """Start all profilers"""
+        self.started_at = datetime.now()
+        if self.trace_memory:
+            tracemalloc.start()
+        self._sampler = threading.Thread(target=self._sample, name='profiler-sampler', daemon=True)
+        self._sampler.start()
+        # cProfile only sees the thread that enables it (before 3.12)
+        threading.setprofile(self._profile_thread)
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        self._profile.enable()
+        self._running = True
+        logging.info(f"Profiling {self.name}...")
+        return self
+
+    def _merged_stats(self):
+        """Combine the main-thread profile with those of finished threads.
+
+        Threads still running are left out: their profiler can only be
+        stopped from the thread itself.
+        """
+        stats = pstats.Stats(self._profile)
+        still_running = []
+        for thread, profile in self._thread_profiles:
+            if thread.is_alive():
+                still_running.append(thread.name)
+            else:
+                stats.add(profile)
+        return stats, still_running
+
+    def _thread_summary(self, wall):
+        """Per-thread sample counts with the network wait they represent"""
+        seconds_per_tick = wall / self._ticks if self._ticks else 0
+        return {
+            name: dict(counts, network_wait_seconds=round(counts['network'] * seconds_per_tick, 4))
+            for name, counts in self._thread_samples.items()
+        }
+
+    def stop(self):
+        """Stop profiling, write the results and return the summary"""
+        if not self._running:
+            return None
+        self._running = False
+        self._profile.disable()
+        wall = time.perf_counter() - self._wall_start
+        cpu = time.process_time() - self._cpu_start
+        threading.setprofile(None)
+        self._stop_sampling.set()
+        self._sampler.join()
+
+        stats, still_running = self._merged_stats()
+        functions = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:self.top]
+
+        summary = {
+            'name': self.name,
+            'started_at': self.started_at.isoformat(),
+            'wall_seconds': round(wall, 4),
+            'threads': self._thread_summary(wall),
+            'unprofiled_threads': still_running,
+            'top_functions': [
+                {
+                    'function': f"{func} ({os.path.basename(filename)}:{lineno})",
+                    'calls': calls,
+                    'tottime': round(tottime, 6),
+                    'cumtime': round(cumtime, 6)
+                }
+                for (filename, lineno, func), (_, calls, tottime, cumtime, _) in functions
+            ]
+        }
+
+        if self.trace_memory:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            summary['peak_memory_bytes'] = peak
+            summary['top_allocations'] = [
+                {
+                    'location': str(stat.traceback),
+                    'size_bytes': stat.size,
+                    'count': stat.count
+                }
+                for stat in snapshot.statistics('lineno')[:self.top]
+            ]
+            message = f"wall {wall:.2f}s (inflated by tracemalloc), peak memory {peak / 1024 / 1024:.1f} MiB"
+        else:
+            summary['cpu_seconds'] = round(cpu, 4)
+            summary['off_cpu_seconds'] = round(max(wall - cpu, 0), 4)
+            message = f"wall {wall:.2f}s, CPU {cpu:.2f}s"
+            if self.network_estimate:
+                # Wall time during which any thread (e.g. the report's main
+                # thread or the sheets-outbox worker) was blocked in network code
+                network_share = self._network_ticks / self._ticks if self._ticks else 0
+                summary['network_wait_seconds'] = round(wall * network_share, 4)
+                message += f", network wait ~{summary['network_wait_seconds']:.2f}s"
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, f"{self.name}-{self.started_at.strftime('%Y%m%d-%H%M%S')}")
+        with open(f"{base}.json", 'w') as f:
+            json.dump(summary, f, indent=2)
+        with open(f"{base}.collapsed", 'w') as f:
+            for stack, count in self._stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        stats.dump_stats(f"{base}.pstats")
+
+        logging.info(f"Profile {self.name}: {message}")
+        logging.info(f"Profile written to {base}.json / .collapsed / .pstats")
+        return summary
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+
+def profile_from_argv(name, argv=None, network_estimate=True):
+    """Start a Profiler if --profile or --profile-memory was passed.
+
+    --profile records timings; --profile-memory adds tracemalloc instead
+    of the CPU / network-wait split. The flag is removed from argv so the
+    script's own argument handling is unaffected, and the profile is
+    written at exit. Returns the Profiler, or None when not profiling.
+    """
+    argv = sys.argv if argv is None else argv
+    if '--profile-memory' in argv:
+        argv.remove('--profile-memory')
+        trace_memory = True
+    elif '--profile' in argv:
+        argv.remove('--profile')
+        trace_memory = False
+    else:
+        return None
+    if not logging.getLogger().handlers:
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    profiler = Profiler(name, trace_memory=trace_memory, network_estimate=network_estimate).start()
+    atexit.register(profiler.stop)
+    return profiler
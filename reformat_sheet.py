@@ -4,10 +4,15 @@ from dotenv import load_dotenv
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
+from google.auth.credentials import AnonymousCredentials
 from googleapiclient.discovery import build
 import pickle
 from datetime import datetime, timedelta
 import requests
+from profiling import profile_from_argv
+
+# Profile the whole script when run with --profile
+profile_from_argv('reformat')
 
 # Load environment variables
 load_dotenv()
@@ -19,12 +24,16 @@ API_KEY = os.getenv('HIGHLEVEL_API_KEY')
 SUBACCOUNT_ID = os.getenv('HIGHLEVEL_SUBACCOUNT_ID')
 
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
+# Optional local Sheets API stand-in, e.g. for offline profiling
+SHEETS_API_ENDPOINT = os.getenv('SHEETS_API_ENDPOINT')
 creds = None
 
-if os.path.exists('token.pickle'):
+if SHEETS_API_ENDPOINT:
+    creds = AnonymousCredentials()
+elif os.path.exists('token.pickle'):
     with open('token.pickle', 'rb') as token:
         creds = pickle.load(token)
-if not creds or not creds.valid:
+if not SHEETS_API_ENDPOINT and (not creds or not creds.valid):
     if creds and creds.expired and creds.refresh_token:
         creds.refresh(Request())
     else:
@@ -33,12 +42,13 @@ if not creds or not creds.valid:
     with open('token.pickle', 'wb') as token:
         pickle.dump(creds, token)
 
-service = build('sheets', 'v4', credentials=creds)
+client_options = {'api_endpoint': SHEETS_API_ENDPOINT} if SHEETS_API_ENDPOINT else None
+service = build('sheets', 'v4', credentials=creds, client_options=client_options)
 sheet = service.spreadsheets()
 
 def get_invoices():
     """Get list of invoices from HighLevel API"""
-    base_url = "https://services.leadconnectorhq.com"
+    base_url = os.getenv('HIGHLEVEL_BASE_URL', "https://services.leadconnectorhq.com")
     headers = {
         'Authorization': f'Bearer {API_KEY}',
         'Content-Type': 'application/json',
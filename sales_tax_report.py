@@ -5,6 +5,7 @@ from dotenv import load_dotenv
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
+from google.auth.credentials import AnonymousCredentials
 from googleapiclient.discovery import build
 import pickle
 import json
@@ -12,25 +13,27 @@ import time
 import schedule
 import logging
 from collections import defaultdict
+from sheets_outbox import SheetsOutbox
+from customer_index import CustomerIndex, normalize_invoices
+from profiling import profile_from_argv
+from log_config import setup_logging, setup_audit_log
 
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('sales_tax_report.log'),
-        logging.StreamHandler()
-    ]
-)
+# Set up logging; per-invoice detail goes to the optional audit stream
+setup_logging('sales_tax_report.log')
+audit_log = setup_audit_log()
 
 # Load environment variables
 load_dotenv()
 
+# How long run_report waits for the background Google Sheets write
+SHEETS_DRAIN_TIMEOUT = 300
+
 class SalesTaxReport:
     def __init__(self):
         self.api_key = os.getenv('HIGHLEVEL_API_KEY')
         self.subaccount_id = os.getenv('HIGHLEVEL_SUBACCOUNT_ID')
-        self.base_url = "https://services.leadconnectorhq.com"
+        # Can point at a local API stand-in, e.g. when profiling offline
+        self.base_url = os.getenv('HIGHLEVEL_BASE_URL', "https://services.leadconnectorhq.com")
         self.headers = {
             'Authorization': f'Bearer {self.api_key}',
             'Content-Type': 'application/json',
@@ -41,6 +44,13 @@ class SalesTaxReport:
         self.spreadsheet_id = os.getenv('SPREADSHEET_ID')
         self.worksheet_name = os.getenv('WORKSHEET_NAME')
         self.sheets_service = self._setup_google_sheets()
+        # The outbox writes from its own thread, so it builds its own client;
+        # the httplib2 transport behind sheets_service is not thread-safe
+        self.sheets_outbox = SheetsOutbox(self._build_sheets_service, self.spreadsheet_id)
+        
+        # Replay any sheet writes left over from an earlier run
+        if self.sheets_outbox.pending():
+            self.sheets_outbox.drain_async()
         
         # Track last run time
         self.last_run_file = 'last_run.txt'
@@ -69,6 +79,12 @@ class SalesTaxReport:
         SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
         creds = None
         
+        # A local Sheets API stand-in (e.g. for offline profiling) needs no OAuth
+        self.sheets_api_endpoint = os.getenv('SHEETS_API_ENDPOINT')
+        if self.sheets_api_endpoint:
+            self.credentials = AnonymousCredentials()
+            return self._build_sheets_service()
+        
         # The file token.pickle stores the user's access and refresh tokens
         if os.path.exists('token.pickle'):
             with open('token.pickle', 'rb') as token:
@@ -87,7 +103,13 @@ class SalesTaxReport:
             with open('token.pickle', 'wb') as token:
                 pickle.dump(creds, token)
 
-        return build('sheets', 'v4', credentials=creds)
+        self.credentials = creds
+        return self._build_sheets_service()
+
+    def _build_sheets_service(self):
+        """Build a Sheets API client, pointed at SHEETS_API_ENDPOINT if set"""
+        client_options = {'api_endpoint': self.sheets_api_endpoint} if self.sheets_api_endpoint else None
+        return build('sheets', 'v4', credentials=self.credentials, client_options=client_options)
 
     def test_api_access(self):
         """Test basic API access with different endpoints"""
@@ -174,9 +196,9 @@ class SalesTaxReport:
                 logging.info(f"Found {total} total paid invoices")
                 
                 # Debug: Print first invoice structure
-                if invoices:
-                    logging.info("First invoice structure:")
-                    logging.info(json.dumps(invoices[0], indent=2))
+                if invoices and logging.getLogger().isEnabledFor(logging.DEBUG):
+                    logging.debug("First invoice structure:")
+                    logging.debug(json.dumps(invoices[0], indent=2))
                 
                 return invoices
             else:
@@ -235,9 +257,11 @@ class SalesTaxReport:
                     'tax': monthly_data[month]
                 })
             
-            # Save chart data to JSON file
-            with open('chart_data.json', 'w') as f:
+            # Save chart data to JSON file; write then rename so the chart
+            # server never picks up a half-written file
+            with open('chart_data.json.tmp', 'w') as f:
                 json.dump(chart_data, f)
+            os.replace('chart_data.json.tmp', 'chart_data.json')
             
             return chart_data
             
@@ -262,8 +286,8 @@ class SalesTaxReport:
         logging.info("-" * 80)
         return iframe_code
 
-    def update_google_sheet(self, invoices):
-        """Update Google Sheet with invoice data"""
+    def update_google_sheet(self, records):
+        """Queue normalized invoice records for the Google Sheet and start writing them in the background"""
         try:
             # Prepare the data
             values = [
@@ -272,45 +296,27 @@ class SalesTaxReport:
             ]
             
             # Add invoice rows
-            for invoice in invoices:
-                invoice_number = invoice.get('invoiceNumber', 'N/A')
-                issue_date = datetime.strptime(invoice.get('issueDate', ''), '%Y-%m-%dT%H:%M:%S.%fZ').strftime('%Y-%m-%d')
-                customer_name = invoice.get('contactDetails', {}).get('name', 'N/A')
-                subtotal = invoice.get('totalSummary', {}).get('subTotal', 0)
-                tax = invoice.get('totalSummary', {}).get('tax', 0)
-                total = invoice.get('total', 0)
-                status = invoice.get('status', 'N/A')
-                
+            for record in records:
                 values.append([
-                    invoice_number,
-                    issue_date,
-                    customer_name,
-                    self.format_currency(subtotal),
-                    self.format_currency(tax),
-                    self.format_currency(total),
-                    status
+                    record['invoice_number'],
+                    record['date'],
+                    record['customer_name'],
+                    self.format_currency(record['subtotal']),
+                    self.format_currency(record['tax']),
+                    self.format_currency(record['total']),
+                    record['status']
                 ])
             
-            # Clear existing content
-            range_name = f'{self.worksheet_name}!A1:G1000'
-            self.sheets_service.spreadsheets().values().clear(
-                spreadsheetId=self.spreadsheet_id,
-                range=range_name
-            ).execute()
-            
-            # Update with new data
-            body = {
-                'values': values
-            }
+            # Pad with blank rows so a single write replaces the old content;
+            # this avoids the window where the sheet is cleared but not rewritten
+            num_rows = max(1000, len(values))
+            values += [[''] * 7 for _ in range(num_rows - len(values))]
+            range_name = f'{self.worksheet_name}!A1:G{num_rows}'
             
-            result = self.sheets_service.spreadsheets().values().update(
-                spreadsheetId=self.spreadsheet_id,
-                range=range_name,
-                valueInputOption='RAW',
-                body=body
-            ).execute()
-            
-            logging.info(f"Updated {result.get('updatedCells')} cells in Google Sheet")
+            # Queue the write and send it in the background; anything that
+            # fails is kept in the outbox and replayed on the next run
+            self.sheets_outbox.enqueue(range_name, values)
+            self.sheets_outbox.drain_async()
             
             # Generate iframe code for the Google Sheet
             iframe_code = f'''
@@ -343,47 +349,46 @@ class SalesTaxReport:
             invoices = self.get_invoices(start_date, end_date)
             
             if invoices:
+                # Parse every invoice once; the records feed the customer
+                # index, the audit stream and the sheet rows
+                records, skipped = normalize_invoices(invoices)
+                logging.info(f"Fetched {len(invoices)} paid invoices, parsed {len(records)}, skipped {len(skipped)}")
+                if skipped:
+                    # A skipped invoice would silently drop its tax from the
+                    # totals, so fail the run rather than report wrong numbers
+                    raise ValueError(f"Could not parse {len(skipped)} invoice(s): {', '.join(map(str, skipped))}")
+                
+                # Merge this sync into the per-customer index
+                customer_index = CustomerIndex.load()
+                customer_index.sync(records)
+                customer_index.save()
+                
                 logging.info("\n=== Sales Tax Report ===")
                 logging.info(f"Period: {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}")
-                logging.info("\nPaid Invoices:")
-                logging.info("-" * 80)
+                logging.info(f"Paid invoices: {len(records)} of {len(invoices)} fetched")
                 
                 total_sales = 0
                 total_tax = 0
+                audit_enabled = audit_log.isEnabledFor(logging.INFO)
                 
-                for invoice in invoices:
-                    invoice_number = invoice.get('invoiceNumber', 'N/A')
-                    issue_date = datetime.strptime(invoice.get('issueDate', ''), '%Y-%m-%dT%H:%M:%S.%fZ').strftime('%Y-%m-%d')
-                    customer_name = invoice.get('contactDetails', {}).get('name', 'N/A')
-                    subtotal = invoice.get('totalSummary', {}).get('subTotal', 0)
-                    tax = invoice.get('totalSummary', {}).get('tax', 0)
-                    total = invoice.get('total', 0)
+                for record in records:
+                    if audit_enabled:
+                        audit_log.info(json.dumps(record))
                     
-                    logging.info(f"\nInvoice #{invoice_number}")
-                    logging.info(f"Date: {issue_date}")
-                    logging.info(f"Customer: {customer_name}")
-                    logging.info(f"Subtotal: {self.format_currency(subtotal)}")
-                    logging.info(f"Sales Tax: {self.format_currency(tax)}")
-                    logging.info(f"Total: {self.format_currency(total)}")
-                    logging.info("-" * 40)
-                    
-                    total_sales += subtotal
-                    total_tax += tax
+                    total_sales += record['subtotal']
+                    total_tax += record['tax']
                 
                 logging.info("\n=== Summary ===")
                 logging.info(f"Total Sales: {self.format_currency(total_sales)}")
                 logging.info(f"Total Sales Tax: {self.format_currency(total_tax)}")
                 logging.info(f"Total Revenue: {self.format_currency(total_sales + total_tax)}")
                 
-                # Generate chart data
-                chart_data = self.generate_chart_data(invoices)
-                
-                # Save chart data to JSON file
-                with open('chart_data.json', 'w') as f:
-                    json.dump(chart_data, f)
+                # Generate chart data (also saved to chart_data.json, which
+                # serve.py picks up and pushes to connected widgets)
+                self.generate_chart_data(records)
                 
                 # Update Google Sheet
-                self.update_google_sheet(invoices)
+                self.update_google_sheet(records)
                 
                 # Save the current run time
                 self._save_last_run()
@@ -400,10 +405,23 @@ def run_report():
         report = SalesTaxReport()
         report.generate_report()
         logging.info("Report generated successfully at " + datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        
+        # Give the background sheet write a bounded wait so the log shows
+        # whether it landed; anything unsent is replayed on the next run
+        if report.sheets_outbox.wait(timeout=SHEETS_DRAIN_TIMEOUT):
+            if report.sheets_outbox.pending():
+                logging.warning("Google Sheet update failed; pending writes will be retried on the next run")
+            else:
+                logging.info("Google Sheet update finished")
+        else:
+            logging.warning(f"Google Sheet update still running after {SHEETS_DRAIN_TIMEOUT}s")
     except Exception as e:
         logging.error(f"Error running report: {str(e)}")
 
 if __name__ == "__main__":
+    # --profile can be combined with --schedule or a single run
+    profile_from_argv('report')
+    
     # Check if running in scheduled mode
     if len(os.sys.argv) > 1 and os.sys.argv[1] == '--schedule':
         logging.info("Starting scheduled report generation...")
@@ -1,25 +1,55 @@
 import http.server
 import socketserver
+import threading
 import os
 import sys
 import json
+from urllib.parse import urlparse, parse_qs, unquote
 from datetime import datetime, timedelta
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
+from google.auth.credentials import AnonymousCredentials
 from googleapiclient.discovery import build
 import pickle
 from dotenv import load_dotenv
+from chart_stream import ChartBroadcaster, watch_chart_file
+from customer_index import CustomerIndex
+from profiling import profile_from_argv
+from auth_config import AuthConfigCache, etag_matches
+
+# Profile the server until it stops when run with --profile; the main
+# thread only waits for connections, so there is no network-wait estimate
+profile_from_argv('serve', network_estimate=False)
 
 # Load environment variables
 load_dotenv()
 
 PORT = 8000
+# Only reachable from this machine unless a deployment opts in to a public bind
+HOST = os.getenv('SERVE_HOST', '127.0.0.1')
 SPREADSHEET_ID = os.getenv('SPREADSHEET_ID')
 WORKSHEET_NAME = 'copy of reformatted'
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets.readonly']
+# Optional local Sheets API stand-in, e.g. for offline profiling
+SHEETS_API_ENDPOINT = os.getenv('SHEETS_API_ENDPOINT')
+CHART_DATA_FILE = 'chart_data.json'
+CUSTOMER_INDEX_FILE = 'customer_index.json'
+HEARTBEAT_SECONDS = 15
+
+# The only local files served as static content; everything else in the
+# working directory (credentials, tokens, logs, local state) stays private
+STATIC_FILES = {'/chart.html', '/chart_data.json'}
+
+# Public OAuth config, kept in memory and reloaded when credentials.json changes
+auth_config = AuthConfigCache('credentials.json')
+
+# Shared by every connected widget; fed by a single watcher thread
+broadcaster = ChartBroadcaster()
 
 def get_credentials():
+    if SHEETS_API_ENDPOINT:
+        return AnonymousCredentials()
     creds = None
     if os.path.exists('token.pickle'):
         with open('token.pickle', 'rb') as token:
@@ -36,7 +66,8 @@ def get_credentials():
 
 def get_chart_data():
     try:
-        service = build('sheets', 'v4', credentials=get_credentials())
+        client_options = {'api_endpoint': SHEETS_API_ENDPOINT} if SHEETS_API_ENDPOINT else None
+        service = build('sheets', 'v4', credentials=get_credentials(), client_options=client_options)
         sheet = service.spreadsheets()
         
         # Get data from the reformatted sheet
@@ -100,6 +131,23 @@ def get_chart_data():
         print(f"Error getting chart data: {str(e)}")
         return []
 
+_customer_index = None
+_customer_index_mtime = None
+_customer_index_lock = threading.Lock()
+
+def get_customer_index():
+    """Return the customer index, reloading it only when the file changes"""
+    global _customer_index, _customer_index_mtime
+    with _customer_index_lock:
+        try:
+            mtime = os.path.getmtime(CUSTOMER_INDEX_FILE)
+        except OSError:
+            mtime = None
+        if _customer_index is None or mtime != _customer_index_mtime:
+            _customer_index = CustomerIndex.load(CUSTOMER_INDEX_FILE)
+            _customer_index_mtime = mtime
+        return _customer_index
+
 class MyHandler(http.server.SimpleHTTPRequestHandler):
     def log_message(self, format, *args):
         sys.stderr.write("%s - - [%s] %s\n" %
@@ -119,17 +167,134 @@ class MyHandler(http.server.SimpleHTTPRequestHandler):
             chart_data = get_chart_data()
             self.wfile.write(json.dumps(chart_data).encode())
             return
+        
+        url = urlparse(self.path)
+        if url.path == '/auth-config':
+            self.send_auth_config()
+            return
+        
+        if url.path == '/api/customers' or url.path.startswith('/api/customers/'):
+            self.send_customer_data(url)
+            return
+        
+        if self.path == '/api/chart-stream':
+            self.stream_chart_updates()
+            return
+            
+        if not self.is_static_file():
+            self.send_error(404, "File not found")
+            return
             
         return http.server.SimpleHTTPRequestHandler.do_GET(self)
 
+    def do_HEAD(self):
+        if not self.is_static_file():
+            self.send_error(404, "File not found")
+            return
+        return http.server.SimpleHTTPRequestHandler.do_HEAD(self)
+
+    def is_static_file(self):
+        """Return True if the request is for a file that may be served"""
+        return unquote(urlparse(self.path).path) in STATIC_FILES
+
+    def send_json(self, status, payload, cors=False):
+        self.send_response(status)
+        self.send_header('Content-type', 'application/json')
+        if cors:
+            self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(json.dumps(payload).encode())
+
+    def send_auth_config(self):
+        """Serve the OAuth client ID from memory, with ETag revalidation"""
+        try:
+            body, etag = auth_config.get()
+        except Exception as e:
+            print(f"Error reading credentials: {str(e)}")
+            self.send_json(500, {'error': 'Failed to read credentials'}, cors=True)
+            return
+        
+        not_modified = etag_matches(self.headers.get('If-None-Match'), etag)
+        self.send_response(304 if not_modified else 200)
+        for header, value in auth_config.headers(etag).items():
+            self.send_header(header, value)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        if not not_modified:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if not not_modified:
+            self.wfile.write(body)
+
+    def send_customer_data(self, url):
+        """Serve top customers, or one customer's totals and monthly series.
+
+        This is private customer data, so unlike the chart routes it is
+        sent without a CORS header and other origins cannot read it.
+        """
+        index = get_customer_index()
+        customer_id = unquote(url.path[len('/api/customers/'):]) if url.path.startswith('/api/customers/') else ''
+        
+        if not customer_id:
+            query = parse_qs(url.query)
+            try:
+                top = int(query.get('top', ['10'])[0])
+                customers = index.top_customers(top, by=query.get('by', ['tax'])[0])
+            except ValueError as e:
+                self.send_json(400, {'error': str(e)})
+                return
+            self.send_json(200, customers)
+            return
+        
+        summary = index.customer_summary(customer_id)
+        if summary is None:
+            self.send_json(404, {'error': f'Unknown customer: {customer_id}'})
+            return
+        summary['monthly'] = index.customer_time_series(customer_id)
+        self.send_json(200, summary)
+
+    def stream_chart_updates(self):
+        """Push chart data to the client as Server-Sent Events"""
+        self.send_response(200)
+        self.send_header('Content-type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        
+        # EventSource sends the last id it saw when it reconnects
+        since = self.headers.get('Last-Event-ID')
+        since = int(since) if since and since.isdigit() else None
+        
+        try:
+            while True:
+                message = broadcaster.wait_for_update(since, timeout=HEARTBEAT_SECONDS)
+                if message is None:
+                    # Comment line keeps proxies from closing an idle stream
+                    self.wfile.write(b': keep-alive\n\n')
+                else:
+                    since = message['version']
+                    self.wfile.write(f"id: {since}\ndata: {json.dumps(message)}\n\n".encode())
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
 Handler = MyHandler
 Handler.extensions_map.update({
     '.json': 'application/json',
 })
 
+# Watch for new aggregates from report runs and broadcast them
+threading.Thread(
+    target=watch_chart_file, args=(broadcaster, CHART_DATA_FILE), daemon=True
+).start()
+
+class ChartServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    # One thread per connection so open event streams don't block other requests
+    daemon_threads = True
+    allow_reuse_address = True
+
 try:
-    with socketserver.TCPServer(("", PORT), Handler) as httpd:
-        print(f"Server started at http://localhost:{PORT}")
+    with ChartServer((HOST, PORT), Handler) as httpd:
+        print(f"Server started at http://{HOST}:{PORT}")
         print("Current directory:", os.getcwd())
         print("Available files:", os.listdir())
         print("Press Ctrl+C to stop the server")
@@ -0,0 +1,229 @@
+import os
+import json
+import time
+import random
+import logging
+import threading
+from datetime import datetime
+
+# HTTP statuses from the Sheets API that are worth retrying
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _status(error):
+    """Return the HTTP status of a failed Sheets request, if it has one"""
+    status = getattr(getattr(error, 'resp', None), 'status', None)
+    return int(status) if status is not None else None
+
+
+def _is_retryable(error):
+    """Return True if a failed Sheets request should be replayed later"""
+    status = _status(error)
+    if status is not None:
+        return status in RETRYABLE_STATUSES
+    # Socket timeouts, dropped connections and similar transport errors
+    return isinstance(error, (OSError, TimeoutError, ConnectionError))
+
+
+def _is_permanent(error):
+    """Return True if resending the same request can never succeed"""
+    status = _status(error)
+    return status is not None and 400 <= status < 500 and status not in RETRYABLE_STATUSES
+
+
+class SheetsOutbox:
+    """Durable local queue of pending Google Sheets value writes.
+
+    Each pending write is stored by range in a JSON file before anything is
+    sent, so a failed or interrupted run is replayed on the next drain
+    instead of leaving the sheet half-written. Writes to the same range are
+    coalesced (the newest values win) and all pending ranges are sent in a
+    single ``values().batchUpdate`` call. Writes the API rejects outright
+    (4xx other than 429) are moved to a dead-letter file so they cannot
+    block later writes.
+
+    ``service_factory`` is called to build the Sheets client used for
+    sending, so the background thread never shares a client (and its
+    non-thread-safe HTTP transport) with the caller.
+    """
+
+    def __init__(self, service_factory, spreadsheet_id, path='sheets_outbox.json',
+                 dead_letter_path=None, max_attempts=6, base_delay=1.0, max_delay=60.0):
+        self.service_factory = service_factory
+        self.spreadsheet_id = spreadsheet_id
+        self.path = path
+        self.dead_letter_path = dead_letter_path or f"{os.path.splitext(path)[0]}.dead.json"
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._service = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _load(self, path=None):
+        """Load pending writes from disk"""
+        path = path or self.path
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logging.error(f"Error loading Sheets outbox: {str(e)}")
+            return {}
+
+    def _save(self, pending, path=None):
+        """Atomically write pending writes to disk"""
+        path = path or self.path
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(pending, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def pending(self):
+        """Return the pending writes keyed by range"""
+        with self._lock:
+            return self._load()
+
+    def enqueue(self, range_name, values):
+        """Record a write of values to range_name, replacing any older one"""
+        with self._lock:
+            pending = self._load()
+            pending[range_name] = {
+                'values': values,
+                'queued_at': datetime.now().isoformat()
+            }
+            self._save(pending)
+        logging.info(f"Queued {len(values)} rows for {range_name} ({len(pending)} pending ranges)")
+
+    def dead_letters(self):
+        """Return the writes the Sheets API rejected, keyed by range"""
+        with self._lock:
+            return self._load(self.dead_letter_path)
+
+    def _remove(self, entries):
+        """Drop sent entries; newer writes queued meanwhile for the same range stay"""
+        with self._lock:
+            current = self._load()
+            for range_name, entry in entries.items():
+                if current.get(range_name, {}).get('queued_at') == entry['queued_at']:
+                    del current[range_name]
+            self._save(current)
+
+    def _dead_letter(self, entries, error):
+        """Move rejected entries out of the outbox into the dead-letter file"""
+        with self._lock:
+            dead = self._load(self.dead_letter_path)
+            for range_name, entry in entries.items():
+                dead[range_name] = dict(entry, error=str(error))
+            self._save(dead, self.dead_letter_path)
+        self._remove(entries)
+        logging.error(
+            f"Sheets rejected writes to {', '.join(entries)} ({str(error)}); "
+            f"moved to {self.dead_letter_path}"
+        )
+
+    def _send(self, entries):
+        """Send entries in one batch request, retrying transient errors with backoff"""
+        if self._service is None:
+            self._service = self.service_factory()
+        body = {
+            'valueInputOption': 'RAW',
+            'data': [
+                {'range': range_name, 'values': entry['values']}
+                for range_name, entry in entries.items()
+            ]
+        }
+
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return self._service.spreadsheets().values().batchUpdate(
+                    spreadsheetId=self.spreadsheet_id,
+                    body=body
+                ).execute()
+            except Exception as e:
+                if not _is_retryable(e) or attempt >= self.max_attempts:
+                    logging.error(f"Sheets write failed after {attempt} attempt(s): {str(e)}")
+                    raise
+                delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+                delay += random.uniform(0, delay / 2)
+                logging.warning(f"Sheets write failed ({str(e)}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def flush(self):
+        """Send all pending writes in one batch request, retrying with backoff.
+
+        Returns the batchUpdate response, or None if there was nothing to send.
+        If the batch is rejected, each range is resent on its own so only the
+        bad ones are dead-lettered. Transient errors that outlast the retries
+        are raised and the writes stay queued for the next drain.
+        """
+        with self._lock:
+            pending = self._load()
+        if not pending:
+            return None
+
+        try:
+            result = self._send(pending)
+        except Exception as e:
+            if not _is_permanent(e):
+                raise
+            if len(pending) == 1:
+                self._dead_letter(pending, e)
+                return {}
+            # Find out which ranges the API is rejecting
+            for range_name, entry in pending.items():
+                single = {range_name: entry}
+                try:
+                    self._send(single)
+                except Exception as single_error:
+                    if not _is_permanent(single_error):
+                        raise
+                    self._dead_letter(single, single_error)
+                else:
+                    self._remove(single)
+            return {}
+
+        self._remove(pending)
+        logging.info(f"Updated {result.get('totalUpdatedCells')} cells in Google Sheet")
+        return result
+
+    def _drain(self):
+        """Background worker body for drain_async"""
+        try:
+            while True:
+                if self.flush() is None:
+                    # Only exit once nothing is pending; drain_async starts a
+                    # new worker for anything queued after this point
+                    with self._lock:
+                        if not self._load():
+                            self._thread = None
+                            return
+        except Exception as e:
+            logging.error(f"Sheets outbox drain stopped, will retry on next run: {str(e)}")
+            with self._lock:
+                self._thread = None
+
+    def drain_async(self):
+        """Flush pending writes on a background thread and return the thread"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._drain, name='sheets-outbox', daemon=False)
+                self._thread.start()
+            return self._thread
+
+    def wait(self, timeout=None):
+        """Block until the current background drain finishes.
+
+        Returns True if no drain is running anymore, False on timeout.
+        """
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+            return not thread.is_alive()
+        return True
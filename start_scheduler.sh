@@ -6,7 +6,8 @@ if [ -d ".venv" ]; then
 fi
 
 # Start the auth server in the background
-python auth_server.py > auth_server.log 2>&1 &
+# (auth_server.log is written and rotated by the server itself)
+python auth_server.py > auth_server.out 2>&1 &
 
 # Start the file server in the background
 python serve.py > serve.log 2>&1 &
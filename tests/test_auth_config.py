@@ -0,0 +1,44 @@
+import json
+import os
+import pytest
+from auth_config import AuthConfigCache, etag_matches
+
+def write_credentials(path, client_id):
+    with open(path, 'w') as f:
+        json.dump({'installed': {'client_id': client_id}}, f)
+
+def test_config_is_cached_until_file_changes(tmp_path):
+    path = str(tmp_path / 'credentials.json')
+    write_credentials(path, 'first')
+    cache = AuthConfigCache(path, check_interval=0)
+
+    body, etag = cache.get()
+    assert json.loads(body) == {'client_id': 'first'}
+    assert cache.get() == (body, etag)
+
+    write_credentials(path, 'second')
+    os.utime(path, (0, 12345))
+    new_body, new_etag = cache.get()
+    assert json.loads(new_body) == {'client_id': 'second'}
+    assert new_etag != etag
+
+def test_broken_update_keeps_last_good_config(tmp_path):
+    path = str(tmp_path / 'credentials.json')
+    write_credentials(path, 'first')
+    cache = AuthConfigCache(path, check_interval=0)
+    body, _ = cache.get()
+
+    with open(path, 'w') as f:
+        f.write('{not json')
+    os.utime(path, (0, 12345))
+    assert cache.get()[0] == body
+
+def test_missing_file_raises(tmp_path):
+    with pytest.raises(OSError):
+        AuthConfigCache(str(tmp_path / 'missing.json')).get()
+
+def test_etag_matches():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('"x", W/"abc"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+    assert not etag_matches('"x"', '"abc"')
@@ -0,0 +1,54 @@
+import os
+from chart_stream import ChartBroadcaster, compute_delta
+
+def test_compute_delta_only_includes_changed_months():
+    old = [{'month': 'April 2024', 'tax': 10}, {'month': 'March 2024', 'tax': 5}]
+    new = [{'month': 'May 2024', 'tax': 1}, {'month': 'April 2024', 'tax': 10}]
+
+    delta = compute_delta(old, new)
+
+    assert delta['upsert'] == [{'month': 'May 2024', 'tax': 1}]
+    assert delta['remove'] == ['March 2024']
+    assert delta['order'] == ['May 2024', 'April 2024']
+
+def test_new_clients_get_snapshot_and_known_clients_get_delta():
+    broadcaster = ChartBroadcaster()
+    broadcaster.publish([{'month': 'April 2024', 'tax': 10}])
+    broadcaster.publish([{'month': 'April 2024', 'tax': 12}])
+
+    snapshot = broadcaster.wait_for_update(None)
+    assert snapshot['type'] == 'snapshot'
+    assert snapshot['version'] == 2
+
+    delta = broadcaster.wait_for_update(1)
+    assert delta['type'] == 'delta'
+    assert delta['upsert'] == [{'month': 'April 2024', 'tax': 12}]
+
+def test_unchanged_data_is_not_rebroadcast():
+    broadcaster = ChartBroadcaster()
+    assert broadcaster.publish([{'month': 'April 2024', 'tax': 10}])
+    assert not broadcaster.publish([{'month': 'April 2024', 'tax': 10}])
+    assert broadcaster.wait_for_update(1, timeout=0) is None
+
+def test_watcher_survives_malformed_chart_file(tmp_path):
+    import json
+    import threading
+    from chart_stream import watch_chart_file
+
+    path = tmp_path / 'chart_data.json'
+    path.write_text(json.dumps({'month': 'April 2024'}))
+    broadcaster = ChartBroadcaster()
+    stop = threading.Event()
+    watcher = threading.Thread(target=watch_chart_file, args=(broadcaster, str(path), 0.01, stop))
+    watcher.start()
+    try:
+        assert broadcaster.wait_for_update(0, timeout=0.2) is None
+
+        path.write_text(json.dumps([{'month': 'April 2024', 'tax': 10}]))
+        os.utime(path, (0, 12345))
+        assert broadcaster.wait_for_update(0, timeout=2) is not None
+        message = broadcaster.wait_for_update(None)
+        assert message['data'] == [{'month': 'April 2024', 'tax': 10}]
+    finally:
+        stop.set()
+        watcher.join()
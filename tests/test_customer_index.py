@@ -0,0 +1,56 @@
+from customer_index import CustomerIndex, normalize_invoices
+
+def make_invoice(invoice_id, customer_id, date, subtotal, tax):
+    return {
+        '_id': invoice_id,
+        'invoiceNumber': invoice_id,
+        'issueDate': f"{date}T00:00:00.000Z",
+        'contactDetails': {'id': customer_id, 'name': customer_id.title()},
+        'totalSummary': {'subTotal': subtotal, 'tax': tax},
+        'total': subtotal + tax,
+        'status': 'paid'
+    }
+
+def test_running_totals_and_top_customers(tmp_path):
+    index = CustomerIndex(str(tmp_path / 'index.json'))
+    records, _ = normalize_invoices([
+        make_invoice('1', 'alice', '2024-03-01', 100, 10),
+        make_invoice('2', 'bob', '2024-03-02', 50, 5),
+        make_invoice('3', 'alice', '2024-04-01', 200, 20),
+    ])
+    index.sync(records)
+
+    top = index.top_customers(1)
+    assert top[0]['customer_id'] == 'alice'
+    assert top[0]['tax'] == 30
+    assert top[0]['invoices'] == 2
+
+    series = index.customer_time_series('alice')
+    assert [bucket['month'] for bucket in series] == ['2024-03', '2024-04']
+    assert series[1]['tax'] == 20
+
+def test_resync_replaces_invoice_instead_of_double_counting(tmp_path):
+    path = str(tmp_path / 'index.json')
+    index = CustomerIndex(path)
+    records, _ = normalize_invoices([make_invoice('1', 'alice', '2024-03-01', 100, 10)])
+    index.sync(records)
+    index.save()
+
+    index = CustomerIndex.load(path)
+    records, _ = normalize_invoices([make_invoice('1', 'alice', '2024-03-01', 100, 12)])
+    index.sync(records)
+
+    assert index.customer_summary('alice')['tax'] == 12
+    assert len(index.customer_invoices('alice')) == 1
+
+def test_normalize_invoices_reports_unparseable_invoices():
+    good = make_invoice('1', 'alice', '2024-03-01', 100, 10)
+    bad_date = dict(make_invoice('2', 'bob', '2024-03-02', 50, 5), issueDate='')
+    null_contact = dict(make_invoice('3', 'carol', '2024-03-03', 20, 2), contactDetails=None, totalSummary=None)
+
+    records, skipped = normalize_invoices([good, bad_date, null_contact])
+
+    assert [record['id'] for record in records] == ['1', '3']
+    assert records[1]['customer_name'] == 'N/A'
+    assert records[1]['tax'] == 0
+    assert skipped == ['2']
@@ -0,0 +1,27 @@
+import gzip
+import logging
+import os
+from log_config import _rotating_handler, setup_audit_log
+
+def test_rotated_logs_are_compressed(tmp_path):
+    log_file = str(tmp_path / 'report.log')
+    handler = _rotating_handler(log_file, max_bytes=100, backup_count=2, when=None)
+    logger = logging.getLogger('test_log_config.rotation')
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        for i in range(60):
+            logger.warning(f"line {i}")
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+
+    assert sorted(os.listdir(tmp_path)) == ['report.log', 'report.log.1.gz', 'report.log.2.gz']
+    with gzip.open(tmp_path / 'report.log.1.gz', 'rt') as f:
+        assert 'line' in f.read()
+
+def test_audit_log_is_disabled_without_a_file(monkeypatch):
+    monkeypatch.delenv('AUDIT_LOG_FILE', raising=False)
+    audit = setup_audit_log()
+    assert not audit.isEnabledFor(logging.INFO)
+    assert not audit.propagate
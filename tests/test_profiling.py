@@ -0,0 +1,77 @@
+import json
+import os
+import threading
+import time
+from profiling import Profiler, profile_from_argv
+
+def busy_work():
+    return sum(i * i for i in range(200000))
+
+def read_outputs(tmp_path):
+    files = sorted(os.listdir(tmp_path))
+    assert [os.path.splitext(name)[1] for name in files] == ['.collapsed', '.json', '.pstats']
+    with open(tmp_path / files[1]) as f:
+        summary = json.load(f)
+    with open(tmp_path / files[0]) as f:
+        collapsed = f.read().splitlines()
+    return summary, collapsed
+
+def test_profiler_writes_timings_and_collapsed_stacks(tmp_path):
+    with Profiler('unit', output_dir=str(tmp_path), interval=0.001):
+        busy_work()
+
+    summary, collapsed = read_outputs(tmp_path)
+    assert summary['name'] == 'unit'
+    assert summary['wall_seconds'] >= summary['network_wait_seconds']
+    assert 'cpu_seconds' in summary
+    assert 'peak_memory_bytes' not in summary
+    assert summary['top_functions']
+
+    assert collapsed[0].startswith('MainThread;')
+    assert collapsed[0].rsplit(' ', 1)[1].isdigit()
+
+def test_worker_threads_are_profiled(tmp_path):
+    with Profiler('threads', output_dir=str(tmp_path)):
+        worker = threading.Thread(target=busy_work)
+        worker.start()
+        worker.join()
+
+    summary, _ = read_outputs(tmp_path)
+    assert any(item['function'].startswith('busy_work ') for item in summary['top_functions'])
+
+def test_memory_run_skips_time_split(tmp_path):
+    with Profiler('memory', output_dir=str(tmp_path), trace_memory=True, network_estimate=False):
+        busy_work()
+
+    summary, _ = read_outputs(tmp_path)
+    assert summary['peak_memory_bytes'] > 0
+    assert summary['top_allocations']
+    assert 'cpu_seconds' not in summary
+    assert 'network_wait_seconds' not in summary
+
+def test_profile_from_argv_ignores_runs_without_flag():
+    argv = ['sales_tax_report.py', '--schedule']
+    assert profile_from_argv('report', argv) is None
+    assert argv == ['sales_tax_report.py', '--schedule']
+
+def test_network_wait_on_worker_thread_is_counted(tmp_path):
+    import socket
+    left, right = socket.socketpair()
+
+    def wait_for_reply():
+        # Reads through socket.py like http.client/httplib2 do
+        with left.makefile('rb') as reply:
+            reply.read(1)
+
+    with Profiler('network', output_dir=str(tmp_path), interval=0.001):
+        worker = threading.Thread(target=wait_for_reply, name='sheets-outbox')
+        worker.start()
+        time.sleep(0.2)
+        right.send(b'x')
+        worker.join()
+    left.close()
+    right.close()
+
+    summary, _ = read_outputs(tmp_path)
+    assert summary['network_wait_seconds'] > 0.1
+    assert summary['threads']['sheets-outbox']['network_wait_seconds'] > 0.1
@@ -0,0 +1,132 @@
+import pytest
+from sheets_outbox import SheetsOutbox
+
+class FakeResp:
+    def __init__(self, status):
+        self.status = status
+
+class FakeHttpError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.resp = FakeResp(status)
+
+class FakeSheetsService:
+    """Minimal stand-in for the Sheets API client used by SheetsOutbox"""
+    def __init__(self, failures=(), bad_ranges=()):
+        self.failures = list(failures)
+        self.bad_ranges = set(bad_ranges)
+        self.calls = []
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def batchUpdate(self, spreadsheetId, body):
+        self.calls.append(body)
+        return self
+
+    def execute(self):
+        if self.failures:
+            raise self.failures.pop(0)
+        if any(item['range'] in self.bad_ranges for item in self.calls[-1]['data']):
+            raise FakeHttpError(400)
+        return {'totalUpdatedCells': 1}
+
+def make_outbox(tmp_path, service, **kwargs):
+    return SheetsOutbox(lambda: service, 'sheet-id', path=str(tmp_path / 'outbox.json'), base_delay=0, **kwargs)
+
+def test_writes_to_same_range_are_coalesced(tmp_path):
+    service = FakeSheetsService()
+    outbox = make_outbox(tmp_path, service)
+
+    outbox.enqueue('Sheet1!A1:G1000', [['old']])
+    outbox.enqueue('Sheet1!A1:G1000', [['new']])
+    outbox.flush()
+
+    assert len(service.calls) == 1
+    assert service.calls[0]['data'] == [{'range': 'Sheet1!A1:G1000', 'values': [['new']]}]
+    assert outbox.pending() == {}
+
+def test_quota_errors_are_retried(tmp_path):
+    service = FakeSheetsService(failures=[FakeHttpError(429), FakeHttpError(503)])
+    outbox = make_outbox(tmp_path, service)
+
+    outbox.enqueue('Sheet1!A1:G1000', [['a']])
+    outbox.flush()
+
+    assert len(service.calls) == 3
+    assert outbox.pending() == {}
+
+def test_transient_failures_stay_queued_for_next_run(tmp_path):
+    service = FakeSheetsService(failures=[FakeHttpError(503)])
+    outbox = make_outbox(tmp_path, service, max_attempts=1)
+
+    outbox.enqueue('Sheet1!A1:G1000', [['a']])
+    with pytest.raises(FakeHttpError):
+        outbox.flush()
+
+    # A fresh outbox (e.g. the next run) still sees the pending write
+    replay = make_outbox(tmp_path, FakeSheetsService())
+    assert 'Sheet1!A1:G1000' in replay.pending()
+    replay.drain_async().join()
+    assert replay.pending() == {}
+
+def test_rejected_write_is_dead_lettered_without_blocking_others(tmp_path):
+    service = FakeSheetsService(bad_ranges=['None!A1:G1000'])
+    outbox = make_outbox(tmp_path, service)
+
+    outbox.enqueue('None!A1:G1000', [['bad']])
+    outbox.flush()
+    assert outbox.pending() == {}
+    assert 'None!A1:G1000' in outbox.dead_letters()
+
+    outbox.enqueue('Sheet1!A1:G1000', [['good']])
+    outbox.flush()
+    assert service.calls[-1]['data'] == [{'range': 'Sheet1!A1:G1000', 'values': [['good']]}]
+    assert outbox.pending() == {}
+
+def test_rejected_range_is_isolated_from_batch(tmp_path):
+    service = FakeSheetsService(bad_ranges=['None!A1:G1000'])
+    outbox = make_outbox(tmp_path, service)
+
+    outbox.enqueue('None!A1:G1000', [['bad']])
+    outbox.enqueue('Sheet1!A1:G1000', [['good']])
+    outbox.drain_async().join()
+
+    assert outbox.pending() == {}
+    assert list(outbox.dead_letters()) == ['None!A1:G1000']
+    assert {'range': 'Sheet1!A1:G1000', 'values': [['good']]} in service.calls[-1]['data']
+
+def test_write_queued_after_drain_finishes_starts_new_worker(tmp_path):
+    service = FakeSheetsService()
+    outbox = make_outbox(tmp_path, service)
+
+    outbox.enqueue('Sheet1!A1:G1000', [['a']])
+    outbox.drain_async().join()
+    outbox.enqueue('Sheet1!A1:G1000', [['b']])
+    outbox.drain_async().join()
+
+    assert outbox.pending() == {}
+    assert service.calls[-1]['data'][0]['values'] == [['b']]
+
+def test_wait_reports_whether_drain_finished(tmp_path):
+    import threading
+    release = threading.Event()
+
+    class SlowService(FakeSheetsService):
+        def execute(self):
+            release.wait()
+            return super().execute()
+
+    outbox = make_outbox(tmp_path, SlowService())
+    assert outbox.wait(timeout=0)
+
+    outbox.enqueue('Sheet1!A1:G1000', [['a']])
+    outbox.drain_async()
+    assert not outbox.wait(timeout=0.05)
+
+    release.set()
+    assert outbox.wait(timeout=2)
+    assert outbox.pending() == {}